@@ -33,7 +33,7 @@ async def read_user(user_id: int) -> User:
     :return: Словарь с данными пользователя.
     :raises HTTPException: Если пользователь не найден.
     """
-    user = await retrieve_user(user_id)
+    user = await retrieve_user(user_id, secondary=True)
     if user:
         return user
     raise HTTPException(status_code=404, detail="User not found")
@@ -121,7 +121,7 @@ async def delete_user(user_id: int) -> dict:
 
 @db_router.get("/users/by_wallet/{wallet}", response_model=User, tags=["Users"])
 async def get_user_by_wallet(wallet: str):
-    user = await retrieve_user_by_wallet(wallet)
+    user = await retrieve_user_by_wallet(wallet, secondary=True)
     if user:
         return user
     raise HTTPException(status_code=404, detail="User not found")
@@ -1,50 +1,165 @@
+import hashlib
+import json
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
 from fastapi import HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ReadPreference
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+from pymongo.write_concern import WriteConcern
 
-from settings.db_setting import db, users_collection
+from settings import db_setting
 
 
 class Database:
+    """
+    Менеджер ресурсов MongoDB. Клиент и пул соединений создаются в lifespan приложения
+    через connect() и освобождаются через close().
+    """
     client: AsyncIOMotorClient = None
-    db = None
+    db: AsyncIOMotorDatabase = None
+    users: AsyncIOMotorCollection = None
+    users_read: AsyncIOMotorCollection = None
+
+    def connect(self) -> None:
+        """
+        Создает клиента Motor с настройками пула, таймаутов и write concern из settings.db_setting.
+        Коллекция users_read использует настроенный read preference и предназначена для GET-роутов.
+        """
+        if self.client is not None:
+            return
+        logging.info("Connecting to MongoDB...")
+        self.client = AsyncIOMotorClient(
+            db_setting.DB_URI,
+            maxPoolSize=db_setting.MAX_POOL_SIZE,
+            minPoolSize=db_setting.MIN_POOL_SIZE,
+            maxIdleTimeMS=db_setting.MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=db_setting.WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=db_setting.CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=db_setting.SERVER_SELECTION_TIMEOUT_MS,
+            socketTimeoutMS=db_setting.SOCKET_TIMEOUT_MS,
+        )
+        self.db = self.client.get_database(
+            db_setting.DATABASE_NAME,
+            write_concern=_write_concern(),
+            read_preference=ReadPreference.PRIMARY,
+        )
+        self.users = self.db[db_setting.USERS_COLLECTION]
+        self.users_read = self.db.get_collection(
+            db_setting.USERS_COLLECTION,
+            read_preference=_read_preference(db_setting.READ_PREFERENCE),
+        )
+
+    def close(self) -> None:
+        """
+        Закрывает клиента и освобождает пул соединений.
+        """
+        if self.client is None:
+            return
+        logging.info("Closing MongoDB connection...")
+        self.client.close()
+        self.client = None
+        self.db = None
+        self.users = None
+        self.users_read = None
+        logging.info("MongoDB connection closed")
+
+
+def _write_concern() -> Optional[WriteConcern]:
+    """
+    Собирает WriteConcern из DB_WRITE_CONCERN_*. Если ни одна переменная не задана,
+    возвращает None, чтобы действовал write concern из DB_URI или дефолт сервера.
+    """
+    options: Dict[str, Any] = {}
+    if db_setting.WRITE_CONCERN_W is not None:
+        w: Union[int, str] = db_setting.WRITE_CONCERN_W
+        options["w"] = int(w) if w.isdigit() else w
+    if db_setting.WRITE_CONCERN_J is not None:
+        options["j"] = db_setting.WRITE_CONCERN_J.lower() == "true"
+    if db_setting.WRITE_CONCERN_TIMEOUT_MS is not None:
+        options["wtimeout"] = int(db_setting.WRITE_CONCERN_TIMEOUT_MS)
+    return WriteConcern(**options) if options else None
+
+
+def _read_preference(name: str):
+    try:
+        return getattr(ReadPreference, name.upper())
+    except AttributeError:
+        raise ValueError(f"Unknown read preference: {name}")
 
 
 database = Database()
 
 
+def _schema_fingerprint() -> str:
+    """
+    Отпечаток декларативной схемы индексов, чтобы заметить ее изменение без увеличения SCHEMA_VERSION.
+    """
+    schema = {"indexes": db_setting.USERS_INDEXES, "dropped": db_setting.DROPPED_INDEXES}
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+
 async def initialize_db() -> None:
     """
-    Инициализирует коллекцию пользователей в MongoDB.
-    Создает индексы для уникальности и быстрого доступа к полям, таким как userId.
-    Если база данных уже существует, выводит соответствующее сообщение.
+    Применяет декларативную схему индексов из settings.db_setting.
+    Версия схемы хранится в коллекции schema_migrations и только растет: если она не меньше
+    SCHEMA_VERSION, миграция пропускается и старт воркера обходится одним запросом к базе.
+    Более старый воркер при rolling deploy не откатывает схему, примененную новым.
     """
+    version = db_setting.SCHEMA_VERSION
+    fingerprint = _schema_fingerprint()
+    migrations = database.db[db_setting.MIGRATIONS_COLLECTION]
     try:
-        logging.info("Connecting to MongoDB...")
-        # Проверка и создание коллекции, если она не существует
-        if "users" not in await db.list_collection_names():
-            logging.info("Creating collection: users")
-            await db.create_collection("users")
-
-        # Получение коллекции пользователей
-        existing_indexes = await users_collection.index_information()
-        if 'userId_1' in existing_indexes:
-            logging.info("Database already initialized with required indexes.")
-        else:
-            await users_collection.create_index(
-                [("ref", "text")], name="search_index", default_language="english"
+        applied = await migrations.find_one({"_id": db_setting.USERS_COLLECTION})
+        if applied and applied.get("version", 0) >= version:
+            if applied["version"] == version and applied.get("fingerprint") != fingerprint:
+                logging.warning(
+                    f"Index schema differs from the one recorded for version {version}: "
+                    f"USERS_INDEXES or DROPPED_INDEXES changed without bumping SCHEMA_VERSION"
+                )
+            else:
+                logging.info(f"Database schema is up to date (version {applied['version']})")
+            return
+        await _migrate_users_indexes()
+        try:
+            await migrations.update_one(
+                {"_id": db_setting.USERS_COLLECTION, "version": {"$lt": version}},
+                {"$set": {"version": version, "fingerprint": fingerprint}},
+                upsert=True,
             )
-            await users_collection.create_index("user_id", unique=True)
-            logging.info("Database initialized successfully with indexes on user_id")
-    except Exception as e:
-        logging.error(f"Error initializing database: {e}")
+        except DuplicateKeyError:
+            # Параллельный воркер уже записал эту или более новую версию
+            pass
+        logging.info(f"Database migrated to schema version {version}")
+    except PyMongoError:
+        logging.exception(
+            f"Database migration failed, schema is NOT at version {version}; "
+            f"it will be retried on the next start"
+        )
+
+
+async def _migrate_users_indexes() -> None:
+    """
+    Удаляет индексы из DROPPED_INDEXES и создает индексы из USERS_INDEXES.
+    Индексы, которых нет ни в одном списке (например, созданные вручную), не трогает.
+    """
+    existing = await database.users.index_information()
+    for name in db_setting.DROPPED_INDEXES:
+        if name not in existing:
+            continue
+        logging.info(f"Dropping retired index: {name}")
+        try:
+            await database.users.drop_index(name)
+        except OperationFailure as e:
+            # Индекс мог быть удален параллельно стартующим воркером
+            logging.warning(f"Failed to drop index {name}: {e}")
+    for index in db_setting.USERS_INDEXES:
+        options = {key: value for key, value in index.items() if key != "keys"}
+        await database.users.create_index(index["keys"], **options)
 
 
 async def close_mongo_connection():
-    logging.info("Closing MongoDB connection...")
-    database.client.close()
-    logging.info("MongoDB connection closed")
+    database.close()
 
 
 def user_helper(user: Dict[str, Any]) -> Dict[str, Any]:
@@ -63,14 +178,16 @@ def user_helper(user: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-async def retrieve_user(user_id: int) -> Optional[Dict[str, Any]]:
+async def retrieve_user(user_id: int, secondary: bool = False) -> Optional[Dict[str, Any]]:
     """
     Извлекает пользователя по user_id из базы данных.
 
     :param user_id: Идентификатор пользователя для поиска.
+    :param secondary: Читать с учетом READ_PREFERENCE (для GET-роутов), иначе с primary.
     :return: Словарь с данными пользователя или None, если пользователь не найден.
     """
-    user = await db["users"].find_one({"user_id": user_id})
+    collection = database.users_read if secondary else database.users
+    user = await collection.find_one({"user_id": user_id})
     if user:
         return user_helper(user)
     return None
@@ -83,8 +200,8 @@ async def add_user(user_data: Dict[str, Any]) -> Dict[str, Any]:
     :param user_data: Словарь с данными пользователя.
     :return: Словарь с данными добавленного пользователя.
     """
-    user = await db["users"].insert_one(user_data)
-    new_user = await db["users"].find_one({"_id": user.inserted_id})
+    user = await database.users.insert_one(user_data)
+    new_user = await database.users.find_one({"_id": user.inserted_id})
     return user_helper(new_user)
 
 
@@ -98,9 +215,9 @@ async def update_user(user_id: int, data: Dict[str, Any]) -> bool:
     """
     if len(data) < 1:
         return False
-    user = await db["users"].find_one({"user_id": user_id})
+    user = await database.users.find_one({"user_id": user_id})
     if user:
-        updated_user = await db["users"].update_one(
+        updated_user = await database.users.update_one(
             {"user_id": user_id}, {"$set": data}
         )
         if updated_user.modified_count > 0:
@@ -116,13 +233,13 @@ async def update_wallet(user_id: int, new_wallet: str) -> Optional[Dict[str, Any
     :param new_wallet: Новый кошелек для пользователя.
     :return: Словарь с обновленными данными пользователя или None, если пользователь не найден или кошелек уже существует.
     """
-    existing_wallet = await db["users"].find_one({"wallet": new_wallet})
+    existing_wallet = await database.users.find_one({"wallet": new_wallet})
     if existing_wallet:
         raise HTTPException(status_code=400, detail="Wallet already exists")
 
-    user = await db["users"].find_one({"user_id": user_id})
+    user = await database.users.find_one({"user_id": user_id})
     if user:
-        updated_user = await db["users"].update_one(
+        updated_user = await database.users.update_one(
             {"user_id": user_id}, {"$set": {"wallet": new_wallet}}
         )
         if updated_user.modified_count > 0:
@@ -138,10 +255,10 @@ async def add_points(user_id: int, amount: int) -> Optional[Dict[str, Any]]:
     :param amount: Количество очков для начисления.
     :return: Словарь с обновленными данными пользователя или None, если пользователь не найден.
     """
-    user = await db["users"].find_one({"user_id": user_id})
+    user = await database.users.find_one({"user_id": user_id})
     if user:
         new_points = user["points"] + amount
-        updated_user = await db["users"].update_one(
+        updated_user = await database.users.update_one(
             {"user_id": user_id}, {"$set": {"points": new_points}}
         )
         if updated_user.modified_count > 0:
@@ -157,12 +274,12 @@ async def subtract_points(user_id: int, amount: int) -> Optional[Dict[str, Any]]
     :param amount: Количество очков для вычитания.
     :return: Словарь с обновленными данными пользователя или None, если пользователь не найден.
     """
-    user = await db["users"].find_one({"user_id": user_id})
+    user = await database.users.find_one({"user_id": user_id})
     if user:
         new_points = user["points"] - amount
         if new_points < 0:
             new_points = 0  # Убедимся, что количество очков не может быть отрицательным
-        updated_user = await db["users"].update_one(
+        updated_user = await database.users.update_one(
             {"user_id": user_id}, {"$set": {"points": new_points}}
         )
         if updated_user.modified_count > 0:
@@ -177,9 +294,9 @@ async def delete_user(user_id: int) -> bool:
     :param user_id: Идентификатор пользователя для удаления.
     :return: True, если удаление было успешным, иначе False.
     """
-    user = await db["users"].find_one({"user_id": user_id})
+    user = await database.users.find_one({"user_id": user_id})
     if user:
-        await db["users"].delete_one({"user_id": user_id})
+        await database.users.delete_one({"user_id": user_id})
         return True
     return False
 
@@ -193,14 +310,14 @@ async def transfer_points_by_user_id(from_user_id: int, to_user_id: int, amount:
     :param amount: Количество очков для перевода.
     :return: Словарь с обновленными данными обоих пользователей или None, если перевод не удался.
     """
-    from_user = await db["users"].find_one({"user_id": from_user_id})
-    to_user = await db["users"].find_one({"user_id": to_user_id})
+    from_user = await database.users.find_one({"user_id": from_user_id})
+    to_user = await database.users.find_one({"user_id": to_user_id})
     if from_user and to_user:
         if from_user["points"] >= amount:
             new_from_user_points = from_user["points"] - amount
             new_to_user_points = to_user["points"] + amount
-            await db["users"].update_one({"user_id": from_user_id}, {"$set": {"points": new_from_user_points}})
-            await db["users"].update_one({"user_id": to_user_id}, {"$set": {"points": new_to_user_points}})
+            await database.users.update_one({"user_id": from_user_id}, {"$set": {"points": new_from_user_points}})
+            await database.users.update_one({"user_id": to_user_id}, {"$set": {"points": new_to_user_points}})
             return {
                 "from_user": await retrieve_user(from_user_id),
                 "to_user": await retrieve_user(to_user_id)
@@ -217,14 +334,14 @@ async def transfer_points_by_wallet(from_wallet: str, to_wallet: str, amount: in
     :param amount: Количество очков для перевода.
     :return: Словарь с обновленными данными обоих пользователей или None, если перевод не удался.
     """
-    from_user = await db["users"].find_one({"wallet": from_wallet})
-    to_user = await db["users"].find_one({"wallet": to_wallet})
+    from_user = await database.users.find_one({"wallet": from_wallet})
+    to_user = await database.users.find_one({"wallet": to_wallet})
     if from_user and to_user:
         if from_user["points"] >= amount:
             new_from_user_points = from_user["points"] - amount
             new_to_user_points = to_user["points"] + amount
-            await db["users"].update_one({"wallet": from_wallet}, {"$set": {"points": new_from_user_points}})
-            await db["users"].update_one({"wallet": to_wallet}, {"$set": {"points": new_to_user_points}})
+            await database.users.update_one({"wallet": from_wallet}, {"$set": {"points": new_from_user_points}})
+            await database.users.update_one({"wallet": to_wallet}, {"$set": {"points": new_to_user_points}})
             return {
                 "from_user": await retrieve_user(from_user["user_id"]),
                 "to_user": await retrieve_user(to_user["user_id"])
@@ -232,11 +349,13 @@ async def transfer_points_by_wallet(from_wallet: str, to_wallet: str, amount: in
     return None
 
 
-async def retrieve_user_by_wallet(wallet: str) -> Optional[Dict[str, Any]]:
+async def retrieve_user_by_wallet(wallet: str, secondary: bool = False) -> Optional[Dict[str, Any]]:
     """
     Извлекает пользователя по кошельку из базы данных.
 
     :param wallet: Кошелек пользователя для поиска.
+    :param secondary: Читать с учетом READ_PREFERENCE (для GET-роутов), иначе с primary.
     :return: Словарь с данными пользователя или None, если пользователь не найден.
     """
-    return await db["users"].find_one({"wallet": wallet})
+    collection = database.users_read if secondary else database.users
+    return await collection.find_one({"wallet": wallet})
@@ -1,7 +1,7 @@
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from db.logic import close_mongo_connection, initialize_db
+from db.logic import close_mongo_connection, database, initialize_db
 from settings.api_description import description
 from db.api import db_router
 from ws.deposit import ws_deposit_router
@@ -10,6 +10,7 @@ logging.basicConfig(level=logging.INFO)
 
 
 async def lifespan(app: FastAPI):
+    database.connect()
     await initialize_db()
     yield
     await close_mongo_connection()
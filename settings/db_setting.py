@@ -1,5 +1,4 @@
 import os
-import motor.motor_asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,6 +6,35 @@ load_dotenv()
 DB_URI = os.getenv("DB_URI")
 
 DATABASE_NAME = "Goichev_game"
-client = motor.motor_asyncio.AsyncIOMotorClient(DB_URI)
-db = client[DATABASE_NAME]
-users_collection = db['users']
+USERS_COLLECTION = "users"
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+# Пул соединений Motor. Клиент создается в lifespan приложения, а не при импорте.
+MAX_POOL_SIZE = int(os.getenv("DB_MAX_POOL_SIZE", "100"))
+MIN_POOL_SIZE = int(os.getenv("DB_MIN_POOL_SIZE", "0"))
+MAX_IDLE_TIME_MS = int(os.getenv("DB_MAX_IDLE_TIME_MS", "60000"))
+WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("DB_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+CONNECT_TIMEOUT_MS = int(os.getenv("DB_CONNECT_TIMEOUT_MS", "5000"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("DB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+SOCKET_TIMEOUT_MS = int(os.getenv("DB_SOCKET_TIMEOUT_MS", "10000"))
+
+# Read preference для GET-роутов: PRIMARY, PRIMARY_PREFERRED, SECONDARY, SECONDARY_PREFERRED, NEAREST.
+# SECONDARY* разгружает primary, но из-за лага репликации GET сразу после записи может не увидеть изменений.
+READ_PREFERENCE = os.getenv("DB_READ_PREFERENCE", "PRIMARY")
+
+# Write concern: если переменные не заданы, используется значение из DB_URI или дефолт сервера.
+WRITE_CONCERN_W = os.getenv("DB_WRITE_CONCERN_W")  # число узлов или "majority"
+WRITE_CONCERN_J = os.getenv("DB_WRITE_CONCERN_J")  # "true" / "false"
+WRITE_CONCERN_TIMEOUT_MS = os.getenv("DB_WRITE_CONCERN_TIMEOUT_MS")
+
+# Декларативная схема индексов коллекции пользователей.
+# При изменении USERS_INDEXES или DROPPED_INDEXES нужно увеличить SCHEMA_VERSION.
+# Миграции применяются только вперед; если схема изменена без увеличения версии,
+# при старте в лог пишется предупреждение о несовпадении отпечатка схемы.
+SCHEMA_VERSION = 1
+USERS_INDEXES = [
+    {"keys": [("user_id", 1)], "name": "user_id_1", "unique": True},
+    {"keys": [("wallet", 1)], "name": "wallet_1"},
+]
+# Индексы, выведенные из схемы. Остальные индексы, созданные вручную, миграция не трогает.
+DROPPED_INDEXES = ["search_index"]